@@ -11,8 +11,10 @@ setup(
     packages=['snapcast', 'snapcast.control', 'snapcast.client'],
     install_requires=[
         'construct>=2.5.2',
-        'packaging',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+    },
     classifiers=[
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
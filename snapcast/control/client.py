@@ -1,4 +1,5 @@
 """Snapcast client."""
+import asyncio
 import logging
 
 
@@ -9,6 +10,8 @@ _LOGGER = logging.getLogger(__name__)
 class Snapclient():
     """Represents a snapclient."""
 
+    __slots__ = ('_callback_func', '_client', '_last_seen', '_server', '_snapshot')
+
     def __init__(self, server, data):
         """Initialize."""
         self._server = server
@@ -37,9 +40,8 @@ class Snapclient():
     @property
     def friendly_name(self):
         """Get friendly name."""
-        if len(self._client.get('config').get('name')):
-            return self._client.get('config').get('name')
-        return self._client.get('host').get('name')
+        return (self._client.get('config').get('name')
+                or self._client.get('host', {}).get('name', ''))
 
     @property
     def version(self):
@@ -110,26 +112,30 @@ class Snapclient():
     def update_volume(self, data):
         """Update volume."""
         self._client['config']['volume'] = data['volume']
-        _LOGGER.debug('updated volume on %s', self.friendly_name)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('updated volume on %s', self.friendly_name)
         self._server.group(self.group.identifier).callback()
         self.callback()
 
     def update_name(self, data):
         """Update name."""
         self._client['config']['name'] = data['name']
-        _LOGGER.debug('updated name on %s', self.friendly_name)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('updated name on %s', self.friendly_name)
         self.callback()
 
     def update_latency(self, data):
         """Update latency."""
         self._client['config']['latency'] = data['latency']
-        _LOGGER.debug('updated latency on %s', self.friendly_name)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('updated latency on %s', self.friendly_name)
         self.callback()
 
     def update_connected(self, status):
         """Update connected."""
         self._client['connected'] = status
-        _LOGGER.debug('updated connected status to %s on %s', status, self.friendly_name)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('updated connected status to %s on %s', status, self.friendly_name)
         self.callback()
 
     def snapshot(self):
@@ -146,10 +152,12 @@ class Snapclient():
         """Restore snapshotted state."""
         if not self._snapshot:
             return
-        await self.set_name(self._snapshot['name'])
-        await self.set_volume(self._snapshot['volume'])
-        await self.set_muted(self._snapshot['muted'])
-        await self.set_latency(self._snapshot['latency'])
+        await asyncio.gather(
+            self.set_name(self._snapshot['name']),
+            self.set_volume(self._snapshot['volume'], update_group=False),
+            self.set_muted(self._snapshot['muted']),
+            self.set_latency(self._snapshot['latency']))
+        self._server.group(self.group.identifier).callback()
         self.callback()
         _LOGGER.debug('restored snapshot of state of %s', self.friendly_name)
 
@@ -159,7 +167,11 @@ class Snapclient():
             self._callback_func(self)
 
     def set_callback(self, func):
-        """Set callback function."""
+        """Set callback function.
+
+        Client events run it right away. Group and stream events run it on the
+        next loop iteration, once for all such events received together.
+        """
         self._callback_func = func
 
     def __repr__(self):
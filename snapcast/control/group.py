@@ -1,4 +1,5 @@
 """Snapcast group."""
+import asyncio
 import logging
 
 
@@ -9,6 +10,8 @@ _LOGGER = logging.getLogger(__name__)
 class Snapgroup():
     """Represents a snapcast group."""
 
+    __slots__ = ('_callback_func', '_group', '_server', '_snapshot')
+
     def __init__(self, server, data):
         """Initialize."""
         self._server = server
@@ -85,15 +88,16 @@ class Snapgroup():
             ratio = (current_volume - volume) / current_volume
         else:
             ratio = (volume - current_volume) / (100 - current_volume)
-        for data in self._group.get('clients'):
-            client = self._server.client(data.get('id'))
-            client_volume = client.volume
-            if delta < 0:
-                client_volume -= ratio * client_volume
-            else:
-                client_volume += ratio * (100 - client_volume)
-            client_volume = round(client_volume)
-            await client.set_volume(client_volume, update_group=False)
+        clients = [self._server.client(data.get('id')) for data in self._group.get('clients')]
+        if delta < 0:
+            new_volumes = [round(client.volume - ratio * client.volume) for client in clients]
+        else:
+            new_volumes = [round(client.volume + ratio * (100 - client.volume))
+                           for client in clients]
+        # set all volumes concurrently so they are sent as one batch
+        await asyncio.gather(*(client.set_volume(client_volume, update_group=False)
+                               for client, client_volume in zip(clients, new_volumes)))
+        for client, client_volume in zip(clients, new_volumes):
             client.update_volume({
                 'volume': {
                     'percent': client_volume,
@@ -105,10 +109,10 @@ class Snapgroup():
     @property
     def friendly_name(self):
         """Get friendly name."""
-        fname = self.name if self.name != '' else "+".join(
+        fname = self.name or "+".join(
             sorted([self._server.client(c).friendly_name for c in self.clients
                     if c in [client.identifier for client in self._server.clients]]))
-        return fname if fname != '' else self.identifier
+        return fname or self.identifier
 
     @property
     def clients(self):
@@ -148,7 +152,8 @@ class Snapgroup():
         """Update mute."""
         self._group['muted'] = data['mute']
         self.callback()
-        _LOGGER.debug('updated mute on %s', self.friendly_name)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('updated mute on %s', self.friendly_name)
 
     def update_name(self, data):
         """Update name."""
@@ -160,7 +165,8 @@ class Snapgroup():
         """Update stream."""
         self._group['stream_id'] = data['stream_id']
         self.callback()
-        _LOGGER.debug('updated stream to %s on %s', self.stream, self.friendly_name)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('updated stream to %s on %s', self.stream, self.friendly_name)
 
     def snapshot(self):
         """Snapshot current state."""
@@ -175,9 +181,10 @@ class Snapgroup():
         """Restore snapshotted state."""
         if not self._snapshot:
             return
-        await self.set_muted(self._snapshot['muted'])
-        await self.set_volume(self._snapshot['volume'])
-        await self.set_stream(self._snapshot['stream'])
+        await asyncio.gather(
+            self.set_muted(self._snapshot['muted']),
+            self.set_volume(self._snapshot['volume']),
+            self.set_stream(self._snapshot['stream']))
         self.callback()
         _LOGGER.debug('restored snapshot of state of %s', self.friendly_name)
 
@@ -1,57 +1,152 @@
 """Snapcast protocol."""
 
 import asyncio
+import collections
 import json
-import random
+import logging
+
+try:
+    from orjson import dumps as _dumps, loads as _loads
+except ImportError:
+    def _dumps(obj):
+        """Serialize to JSON bytes."""
+        return json.dumps(obj).encode()
+
+    def _loads(data):
+        """Deserialize JSON from bytes or a memoryview."""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+_LOGGER = logging.getLogger(__name__)
 
 SERVER_ONDISCONNECT = 'Server.OnDisconnect'
 
+FRAME_SEPARATOR = b'\r\n'
+FRAME_SEPARATOR_SIZE = len(FRAME_SEPARATOR)
+
+# initial receive buffer size and minimum free space handed to the loop
+BUFFER_SIZE = 65536
+BUFFER_MIN_FREE = 4096
+
+# maximum number of requests sent in one JSONRPC batch
+BATCH_SIZE = 32
+
+
+def _jsonrpc_message(method, identifier, params=None):
+    """Produce an unframed JSONRPC request."""
+    return b''.join((
+        b'{"id":%d,"method":' % identifier,
+        _dumps(method),
+        b',"params":',
+        _dumps(params) if params else b'{}',
+        b',"jsonrpc":"2.0"}'))
+
 
-# pylint: disable=consider-using-f-string
 def jsonrpc_request(method, identifier, params=None):
     """Produce a JSONRPC request."""
-    return '{}\r\n'.format(json.dumps({
-        'id': identifier,
-        'method': method,
-        'params': params or {},
-        'jsonrpc': '2.0'
-    })).encode()
+    return _jsonrpc_message(method, identifier, params) + FRAME_SEPARATOR
+
 
+def jsonrpc_batch(messages):
+    """Produce a JSONRPC batch request from unframed requests."""
+    if len(messages) == 1:
+        return messages[0] + FRAME_SEPARATOR
+    return b'[' + b','.join(messages) + b']' + FRAME_SEPARATOR
 
-class SnapcastProtocol(asyncio.Protocol):
+
+class SnapcastProtocol(asyncio.BufferedProtocol):
     """Async Snapcast protocol."""
 
+    __slots__ = ('_transport', '_buffer', '_callbacks', '_data_buffer', '_consumed',
+                 '_received', '_next_id', '_pending_writes', '_inflight')
+
     def __init__(self, callbacks):
         """Initialize."""
         self._transport = None
         self._buffer = {}
         self._callbacks = callbacks
-        self._data_buffer = ''
+        self._data_buffer = bytearray()
+        self._consumed = 0
+        self._received = 0
+        self._next_id = 0
+        self._pending_writes = []
+        self._inflight = collections.deque()
 
     def connection_made(self, transport):
         """When a connection is made."""
         self._transport = transport
+        self._data_buffer = bytearray(BUFFER_SIZE)
 
     def connection_lost(self, exc):
         """When a connection is lost."""
-        for b in self._buffer.values():
-            b['error'] = {"code": -1, "message": "connection lost"}
-            b['flag'].set()
+        self._pending_writes.clear()
+        self._inflight.clear()
+        for future in self._buffer.values():
+            if not future.done():
+                future.set_result((None, {"code": -1, "message": "connection lost"}))
+        self._buffer.clear()
         self._callbacks.get(SERVER_ONDISCONNECT)(exc)
 
+    def get_buffer(self, sizehint):
+        """Get the buffer to receive data into."""
+        if self._consumed == self._received:
+            self._consumed = self._received = 0
+        buffer = self._data_buffer
+        needed = max(sizehint, BUFFER_MIN_FREE)
+        if len(buffer) - self._received < needed:
+            # move the partial frame to the front, growing into a new buffer
+            # if needed since the loop may still hold a view of the old one
+            pending = self._received - self._consumed
+            if len(buffer) - pending < needed:
+                self._data_buffer = bytearray(max(2 * len(buffer), pending + needed))
+            self._data_buffer[:pending] = buffer[self._consumed:self._received]
+            self._consumed = 0
+            self._received = pending
+        return memoryview(self._data_buffer)[self._received:]
+
+    def buffer_updated(self, nbytes):
+        """Handle data received into the buffer."""
+        buffer = self._data_buffer
+        # only rescan the tail of the previous chunk for a split separator
+        search = max(self._consumed, self._received - FRAME_SEPARATOR_SIZE + 1)
+        self._received += nbytes
+        end = buffer.rfind(FRAME_SEPARATOR, search, self._received)
+        if end == -1:
+            return
+        start = self._consumed
+        self._consumed = end + FRAME_SEPARATOR_SIZE
+        view = memoryview(buffer)
+        handle_data = self.handle_data
+        if buffer.find(FRAME_SEPARATOR, start, end) == -1:
+            if end > start:
+                data = _loads(view[start:end])
+                if isinstance(data, list):
+                    for item in data:
+                        handle_data(item)
+                else:
+                    handle_data(data)
+            return
+        # parse all complete frames in one pass as a JSON array
+        frames = []
+        while start <= end:
+            separator = buffer.find(FRAME_SEPARATOR, start, end + FRAME_SEPARATOR_SIZE)
+            if separator > start:
+                frames.append(view[start:separator])
+            start = separator + FRAME_SEPARATOR_SIZE
+        for data in _loads(b'[' + b','.join(frames) + b']'):
+            if isinstance(data, list):
+                for item in data:
+                    handle_data(item)
+            else:
+                handle_data(data)
+
     def data_received(self, data):
         """Handle received data."""
-        self._data_buffer += data.decode()
-        if not self._data_buffer.endswith('\r\n'):
-            return
-        data = self._data_buffer
-        self._data_buffer = ''  # clear buffer
-        for cmd in data.strip().split('\r\n'):
-            data = json.loads(cmd)
-            if not isinstance(data, list):
-                data = [data]
-            for item in data:
-                self.handle_data(item)
+        with self.get_buffer(len(data)) as buffer:
+            buffer[:len(data)] = data
+        self.buffer_updated(len(data))
 
     def handle_data(self, data):
         """Handle JSONRPC data."""
@@ -62,24 +157,72 @@ class SnapcastProtocol(asyncio.Protocol):
 
     def handle_response(self, data):
         """Handle JSONRPC response."""
-        identifier = data.get('id')
-        self._buffer[identifier]['data'] = data.get('result')
-        self._buffer[identifier]['error'] = data.get('error')
-        self._buffer[identifier]['flag'].set()
+        if data['id'] is None:
+            self._fail_batch(data.get('error'))
+            return
+        future = self._buffer.pop(data['id'], None)
+        if future is not None and not future.done():
+            future.set_result((data.get('result'), data.get('error')))
 
     def handle_notification(self, data):
         """Handle JSONRPC notification."""
-        if data.get('method') in self._callbacks:
-            self._callbacks.get(data.get('method'))(data.get('params'))
+        callback = self._callbacks.get(data.get('method'))
+        if callback is not None:
+            callback(data.get('params'))
 
     async def request(self, method, params):
         """Send a JSONRPC request."""
-        identifier = random.randint(1, 1000)
-        self._transport.write(jsonrpc_request(method, identifier, params))
-        self._buffer[identifier] = {'flag': asyncio.Event()}
-        await self._buffer[identifier]['flag'].wait()
-        result = self._buffer[identifier].get('data')
-        error = self._buffer[identifier].get('error')
-        self._buffer[identifier].clear()
-        del self._buffer[identifier]
-        return (result, error)
+        identifier, future = self._send(method, params)
+        try:
+            return await future
+        finally:
+            # forget the request if the caller stopped waiting for it
+            self._buffer.pop(identifier, None)
+
+    def send(self, method, params):
+        """Queue a JSONRPC request, return the future of its response."""
+        return self._send(method, params)[1]
+
+    def _send(self, method, params):
+        """Queue a JSONRPC request, return its id and response future."""
+        self._next_id = (self._next_id + 1) & 0x7fffffff
+        identifier = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._buffer[identifier] = future
+        # requests made in the same loop iteration are sent as one batch
+        self._pending_writes.append((identifier, _jsonrpc_message(method, identifier, params)))
+        if len(self._pending_writes) == 1:
+            future.get_loop().call_soon(self._flush_writes)
+        return identifier, future
+
+    def _fail_batch(self, error):
+        """Fail the outstanding batch on a batch level error.
+
+        Such an error has no request id, so it is only attributed to a batch
+        when exactly one batch is still waiting for responses.
+        """
+        outstanding = [identifiers for identifiers in self._inflight
+                       if any(identifier in self._buffer for identifier in identifiers)]
+        if len(outstanding) != 1:
+            _LOGGER.warning('cannot attribute batch error to a request: %s', error)
+            return
+        self._inflight.clear()
+        for identifier in outstanding[0]:
+            future = self._buffer.pop(identifier, None)
+            if future is not None and not future.done():
+                future.set_result((None, error))
+
+    def _flush_writes(self):
+        """Write pending requests as JSONRPC batches."""
+        pending = self._pending_writes
+        if not pending:
+            return
+        self._pending_writes = []
+        # forget batches which have been answered completely
+        while self._inflight and not any(
+                identifier in self._buffer for identifier in self._inflight[0]):
+            self._inflight.popleft()
+        for i in range(0, len(pending), BATCH_SIZE):
+            identifiers, messages = zip(*pending[i:i + BATCH_SIZE])
+            self._inflight.append(identifiers)
+            self._transport.write(jsonrpc_batch(messages))
@@ -1,9 +1,13 @@
 """Snapcast server."""
 
 import asyncio
+import functools
 import logging
+import random
+import re
+import socket
+import types
 
-from packaging import version
 from snapcast.control.client import Snapclient
 from snapcast.control.group import Snapgroup
 from snapcast.control.protocol import SERVER_ONDISCONNECT, SnapcastProtocol
@@ -47,18 +51,25 @@ STREAM_ONMETA = 'Stream.OnMetadata'  # deprecated
 STREAM_ADDSTREAM = 'Stream.AddStream'
 STREAM_REMOVESTREAM = 'Stream.RemoveStream'
 
+# reconnect backoff base and cap in seconds
 SERVER_RECONNECT_DELAY = 5
-
-_EVENTS = [SERVER_ONUPDATE, CLIENT_ONVOLUMECHANGED, CLIENT_ONLATENCYCHANGED,
-           CLIENT_ONNAMECHANGED, CLIENT_ONCONNECT, CLIENT_ONDISCONNECT,
-           GROUP_ONMUTE, GROUP_ONSTREAMCHANGED, GROUP_ONNAMECHANGED, STREAM_ONUPDATE,
-           STREAM_ONMETA, STREAM_ONPROPERTIES]
-_METHODS = [SERVER_GETSTATUS, SERVER_GETRPCVERSION, SERVER_DELETECLIENT,
-            SERVER_DELETECLIENT, CLIENT_GETSTATUS, CLIENT_SETNAME,
-            CLIENT_SETLATENCY, CLIENT_SETVOLUME,
-            GROUP_GETSTATUS, GROUP_SETMUTE, GROUP_SETSTREAM, GROUP_SETCLIENTS,
-            GROUP_SETNAME, STREAM_SETMETA, STREAM_SETPROPERTY, STREAM_CONTROL,
-            STREAM_ADDSTREAM, STREAM_REMOVESTREAM]
+SERVER_RECONNECT_MAX_DELAY = 60
+
+# idle seconds before TCP keepalive probes detect a half-open connection
+SERVER_KEEPALIVE_IDLE = 30
+
+_EVENTS = frozenset((SERVER_ONUPDATE, CLIENT_ONVOLUMECHANGED, CLIENT_ONLATENCYCHANGED,
+                     CLIENT_ONNAMECHANGED, CLIENT_ONCONNECT, CLIENT_ONDISCONNECT,
+                     GROUP_ONMUTE, GROUP_ONSTREAMCHANGED, GROUP_ONNAMECHANGED, STREAM_ONUPDATE,
+                     STREAM_ONMETA, STREAM_ONPROPERTIES))
+_METHODS = frozenset((SERVER_GETSTATUS, SERVER_GETRPCVERSION, SERVER_DELETECLIENT,
+                      CLIENT_GETSTATUS, CLIENT_SETNAME, CLIENT_SETLATENCY, CLIENT_SETVOLUME,
+                      GROUP_GETSTATUS, GROUP_SETMUTE, GROUP_SETSTREAM, GROUP_SETCLIENTS,
+                      GROUP_SETNAME, STREAM_SETMETA, STREAM_SETPROPERTY, STREAM_CONTROL,
+                      STREAM_ADDSTREAM, STREAM_REMOVESTREAM))
+# read-only methods, concurrent identical calls share one request
+_READ_METHODS = frozenset((SERVER_GETSTATUS, SERVER_GETRPCVERSION, CLIENT_GETSTATUS,
+                           GROUP_GETSTATUS))
 
 # server versions in which new methods were added
 _VERSIONS = {
@@ -67,6 +78,54 @@ _VERSIONS = {
     STREAM_ADDSTREAM: '0.16.0',
     STREAM_REMOVESTREAM: '0.16.0',
 }
+_VERSION_PATTERN = re.compile(r'\d+(?:\.\d+)*')
+
+
+def _parse_version(value):
+    """Parse the numeric MAJOR.MINOR.PATCH part of a version into a tuple."""
+    match = _VERSION_PATTERN.match(value)
+    if not match:
+        return ()
+    parts = tuple(int(part) for part in match.group().split('.'))
+    # pad so that 0.16 compares equal to 0.16.0
+    return parts + (0,) * (3 - len(parts))
+
+
+_PARSED_VERSIONS = {method: _parse_version(v) for method, v in _VERSIONS.items()}
+
+# events dispatched to Snapserver handlers, OnUpdate and OnProperties are coalesced
+_EVENT_HANDLERS = (
+    (CLIENT_ONCONNECT, '_on_client_connect'),
+    (CLIENT_ONDISCONNECT, '_on_client_disconnect'),
+    (CLIENT_ONVOLUMECHANGED, '_on_client_volume_changed'),
+    (CLIENT_ONNAMECHANGED, '_on_client_name_changed'),
+    (CLIENT_ONLATENCYCHANGED, '_on_client_latency_changed'),
+    (GROUP_ONMUTE, '_on_group_mute'),
+    (GROUP_ONSTREAMCHANGED, '_on_group_stream_changed'),
+    (GROUP_ONNAMECHANGED, '_on_group_name_changed'),
+    (STREAM_ONMETA, '_on_stream_meta'),
+    (STREAM_ONUPDATE, '_on_stream_update'),
+    (SERVER_ONDISCONNECT, '_on_server_disconnect'),
+)
+
+# shared, read-only error returned for requests made while disconnected
+_NOT_CONNECTED_ERROR = types.MappingProxyType({"code": None, "message": "Server not connected"})
+
+
+def _noop(*_args):
+    """Do nothing, the default for unset callbacks."""
+
+
+def _response(result, error, key=None):
+    """Get the error, the result value at key, or the whole result."""
+    if error is not None:
+        return error
+    if key is not None:
+        try:
+            return result[key]
+        except (TypeError, KeyError):
+            pass
+    return result
 
 
 class ServerVersionError(NotImplementedError):
@@ -77,48 +136,69 @@ class ServerVersionError(NotImplementedError):
 class Snapserver():
     """Represents a snapserver."""
 
+    __slots__ = ('_background_tasks', '_callbacks', '_client_callbacks_handle', '_clients',
+                 '_clients_snapshot', '_groups', '_groups_snapshot', '_host', '_is_connected',
+                 '_is_stopped', '_last_status', '_loop', '_new_client_callback_func',
+                 '_on_clients_changed_callback_func', '_on_connect_callback_func',
+                 '_on_disconnect_callback_func', '_on_update_callback_func', '_pending_client_ids',
+                 '_pending_properties', '_pending_reads', '_pending_status', '_port',
+                 '_properties_handle', '_protocol', '_reconnect', '_reconnect_attempt',
+                 '_resync_task', '_stream_groups', '_streams', '_streams_snapshot',
+                 '_synchronize_handle', '_transport', '_unsupported_methods', '_version')
+
     # pylint: disable=too-many-instance-attributes
     def __init__(self, loop, host, port=CONTROL_PORT, reconnect=False):
         """Initialize."""
         self._loop = loop
         self._port = port
         self._reconnect = reconnect
+        self._reconnect_attempt = 0
         self._is_stopped = True
+        self._is_connected = False
         self._clients = {}
         self._streams = {}
         self._groups = {}
+        self._invalidate_snapshots()
+        self._stream_groups = {}
         self._host = host
         self._version = None
+        self._unsupported_methods = frozenset(_VERSIONS)
         self._protocol = None
         self._transport = None
-        self._callbacks = {
-            CLIENT_ONCONNECT: self._on_client_connect,
-            CLIENT_ONDISCONNECT: self._on_client_disconnect,
-            CLIENT_ONVOLUMECHANGED: self._on_client_volume_changed,
-            CLIENT_ONNAMECHANGED: self._on_client_name_changed,
-            CLIENT_ONLATENCYCHANGED: self._on_client_latency_changed,
-            GROUP_ONMUTE: self._on_group_mute,
-            GROUP_ONSTREAMCHANGED: self._on_group_stream_changed,
-            GROUP_ONNAMECHANGED: self._on_group_name_changed,
-            STREAM_ONMETA: self._on_stream_meta,
-            STREAM_ONPROPERTIES: self._on_stream_properties,
-            STREAM_ONUPDATE: self._on_stream_update,
-            SERVER_ONDISCONNECT: self._on_server_disconnect,
-            SERVER_ONUPDATE: self._on_server_update
-        }
-        self._on_update_callback_func = None
-        self._on_connect_callback_func = None
-        self._on_disconnect_callback_func = None
-        self._new_client_callback_func = None
+        self._pending_status = None
+        self._last_status = None
+        self._synchronize_handle = None
+        self._pending_properties = {}
+        self._properties_handle = None
+        self._pending_client_ids = {}
+        self._client_callbacks_handle = None
+        self._resync_task = None
+        self._pending_reads = {}
+        self._background_tasks = set()
+        # apply pending coalesced updates before any later event
+        self._callbacks = {event: functools.partial(self._on_event, getattr(self, name))
+                           for event, name in _EVENT_HANDLERS}
+        self._callbacks[SERVER_ONUPDATE] = self._on_server_update
+        self._callbacks[STREAM_ONPROPERTIES] = self._queue_stream_properties
+        self._on_update_callback_func = _noop
+        self._on_connect_callback_func = _noop
+        self._on_disconnect_callback_func = _noop
+        self._new_client_callback_func = _noop
+        self._on_clients_changed_callback_func = _noop
 
     async def start(self):
         """Initiate server connection."""
         self._is_stopped = False
+        await self._do_start()
+
+    async def _do_start(self):
+        """Connect, then synchronize with the server status."""
         await self._do_connect()
         status, error = await self.status()
         if (not isinstance(status, dict)) or ('server' not in status):
             _LOGGER.warning('connected, but no valid response:\n%s', str(error))
-            self.stop()
+            # keep the reconnect backoff growing across invalid responses
+            self._stop()
             raise OSError
         _LOGGER.debug('connected to snapserver on %s:%s', self._host, self._port)
         self.synchronize(status)
@@ -126,13 +206,39 @@ class Snapserver():
 
     def stop(self):
         """Stop server."""
+        self._reconnect_attempt = 0
+        self._stop()
+
+    def _stop(self):
+        """Disconnect and drop all state."""
         self._is_stopped = True
+        self._is_connected = False
+        self._pending_reads = {}
+        if self._resync_task is not None:
+            self._resync_task.cancel()
+            self._resync_task = None
+        if self._synchronize_handle is not None:
+            self._synchronize_handle.cancel()
+            self._synchronize_handle = None
+            self._pending_status = None
+        if self._properties_handle is not None:
+            self._properties_handle.cancel()
+            self._properties_handle = None
+            self._pending_properties = {}
+        if self._client_callbacks_handle is not None:
+            self._client_callbacks_handle.cancel()
+            self._client_callbacks_handle = None
+            self._pending_client_ids = {}
         self._do_disconnect()
         _LOGGER.debug('Stopping')
         self._clients = {}
         self._streams = {}
         self._groups = {}
+        self._invalidate_snapshots()
+        self._stream_groups = {}
+        self._last_status = None
         self._version = None
+        self._unsupported_methods = frozenset(_VERSIONS)
 
     def _do_disconnect(self):
         """Perform the connection to the server."""
@@ -143,6 +249,12 @@ class Snapserver():
         """Perform the connection to the server."""
         self._transport, self._protocol = await self._loop.create_connection(
             lambda: SnapcastProtocol(self._callbacks), self._host, self._port)
+        self._is_connected = True
+        sock = self._transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, SERVER_KEEPALIVE_IDLE)
 
     def _reconnect_cb(self):
         """Try to reconnect to the server."""
@@ -151,28 +263,43 @@ class Snapserver():
         async def try_reconnect():
             """Actual coroutine ro try to reconnect or reschedule."""
             try:
-                await self._do_connect()
-                status, error = await self.status()
-                if (not isinstance(status, dict)) or ('server' not in status):
-                    _LOGGER.warning('connected, but no valid response:\n%s', str(error))
-                    self.stop()
-                    raise OSError
+                await self._do_start()
             except OSError:
-                self._loop.call_later(SERVER_RECONNECT_DELAY,
-                                      self._reconnect_cb)
-            else:
-                self.synchronize(status)
-                self._on_server_connect()
-        asyncio.ensure_future(try_reconnect())
+                self._loop.call_later(self._reconnect_delay(), self._reconnect_cb)
+        # keep a reference so the task cannot be garbage collected mid-flight
+        task = self._loop.create_task(try_reconnect())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _reconnect_delay(self):
+        """Get the next reconnect delay, exponential backoff with equal jitter."""
+        backoff = min(SERVER_RECONNECT_MAX_DELAY,
+                      SERVER_RECONNECT_DELAY * 2 ** self._reconnect_attempt)
+        # stop growing the exponent once the cap is reached
+        if backoff < SERVER_RECONNECT_MAX_DELAY:
+            self._reconnect_attempt += 1
+        return backoff / 2 + random.uniform(0, backoff / 2)
 
     async def _transact(self, method, params=None):
         """Wrap requests."""
-        result = error = None
-        if self._protocol is None or self._transport is None or self._transport.is_closing():
-            error = {"code": None, "message": "Server not connected"}
-        else:
-            result, error = await self._protocol.request(method, params)
-        return (result, error)
+        if not self._is_connected:
+            return (None, _NOT_CONNECTED_ERROR)
+        if method not in _READ_METHODS:
+            # reads issued after a write must not share a response sent before it
+            self._pending_reads = {}
+            return await self._protocol.request(method, params)
+        key = (method, tuple(params.items()) if params else None)
+        if (future := self._pending_reads.get(key)) is None:
+            future = self._protocol.send(method, params)
+            self._pending_reads[key] = future
+            future.add_done_callback(functools.partial(self._forget_read, key))
+        # a cancelled caller must not cancel the request shared with others
+        return await asyncio.shield(future)
+
+    def _forget_read(self, key, future):
+        """Drop a finished read request unless it was replaced."""
+        if self._pending_reads.get(key) is future:
+            del self._pending_reads[key]
 
     @property
     def version(self):
@@ -195,15 +322,15 @@ class Snapserver():
 
     async def client_name(self, identifier, name):
         """Set client name."""
-        return await self._request(CLIENT_SETNAME, identifier, 'name', name)
+        return await self._request_value(CLIENT_SETNAME, identifier, 'name', name)
 
     async def client_latency(self, identifier, latency):
         """Set client latency."""
-        return await self._request(CLIENT_SETLATENCY, identifier, 'latency', latency)
+        return await self._request_value(CLIENT_SETLATENCY, identifier, 'latency', latency)
 
     async def client_volume(self, identifier, volume):
         """Set client volume."""
-        return await self._request(CLIENT_SETVOLUME, identifier, 'volume', volume)
+        return await self._request_value(CLIENT_SETVOLUME, identifier, 'volume', volume)
 
     async def client_status(self, identifier):
         """Get client status."""
@@ -215,20 +342,21 @@ class Snapserver():
 
     async def group_mute(self, identifier, status):
         """Set group mute."""
-        return await self._request(GROUP_SETMUTE, identifier, 'mute', status)
+        return await self._request_value(GROUP_SETMUTE, identifier, 'mute', status)
 
     async def group_stream(self, identifier, stream_id):
         """Set group stream."""
-        return await self._request(GROUP_SETSTREAM, identifier, 'stream_id', stream_id)
+        self._index_group_stream(identifier, stream_id)
+        return await self._request_value(GROUP_SETSTREAM, identifier, 'stream_id', stream_id)
 
     async def group_clients(self, identifier, clients):
         """Set group clients."""
-        return await self._request(GROUP_SETCLIENTS, identifier, 'clients', clients)
+        return await self._request_value(GROUP_SETCLIENTS, identifier, 'clients', clients)
 
     async def group_name(self, identifier, name):
         """Set group name."""
         self._version_check(GROUP_SETNAME)
-        return await self._request(GROUP_SETNAME, identifier, 'name', name)
+        return await self._request_value(GROUP_SETNAME, identifier, 'name', name)
 
     async def stream_control(self, identifier, control_command, control_params):
         """Set stream control."""
@@ -238,7 +366,7 @@ class Snapserver():
 
     async def stream_setmeta(self, identifier, meta):  # deprecated
         """Set stream metadata."""
-        return await self._request(STREAM_SETMETA, identifier, 'meta', meta)
+        return await self._request_value(STREAM_SETMETA, identifier, 'meta', meta)
 
     async def stream_setproperty(self, identifier, stream_property, value):
         """Set stream metadata."""
@@ -252,15 +380,30 @@ class Snapserver():
         """Add a stream."""
         params = {"streamUri": stream_uri}
         result, error = await self._transact(STREAM_ADDSTREAM, params)
-        if (isinstance(result, dict) and ("id" in result)):
-            self.synchronize((await self.status())[0])
-        return result or error
+        if error is None and isinstance(result, dict) and ("id" in result):
+            # only fetch the status if no update has brought in the stream yet
+            self._flush_pending()
+            if result["id"] not in self._streams:
+                status, _ = await self.status()
+                if isinstance(status, dict) and 'server' in status:
+                    self.synchronize(status)
+        return error if error is not None else result
 
     async def stream_remove_stream(self, identifier):
         """Remove a Stream."""
         result = await self._request(STREAM_REMOVESTREAM, identifier)
         if (isinstance(result, dict) and ("id" in result)):
-            self.synchronize((await self.status())[0])
+            self._flush_pending()
+            if self._streams.pop(identifier, None) is not None:
+                self._streams_snapshot = None
+                self._last_status = None
+            playing = self._groups_of_stream(identifier)
+            self._stream_groups.pop(identifier, None)
+            # the server moves groups off the removed stream, fetch where to
+            if playing:
+                status, _ = await self.status()
+                if isinstance(status, dict) and 'server' in status:
+                    self.synchronize(status)
         return result
 
     def group(self, group_identifier):
@@ -278,48 +421,96 @@ class Snapserver():
     @property
     def groups(self):
         """Get groups."""
-        return list(self._groups.values())
+        if self._groups_snapshot is None:
+            self._groups_snapshot = tuple(self._groups.values())
+        return self._groups_snapshot
 
     @property
     def clients(self):
         """Get clients."""
-        return list(self._clients.values())
+        if self._clients_snapshot is None:
+            self._clients_snapshot = tuple(self._clients.values())
+        return self._clients_snapshot
 
     @property
     def streams(self):
         """Get streams."""
-        return list(self._streams.values())
+        if self._streams_snapshot is None:
+            self._streams_snapshot = tuple(self._streams.values())
+        return self._streams_snapshot
+
+    def _invalidate_snapshots(self):
+        """Drop the cached groups, clients and streams."""
+        self._groups_snapshot = None
+        self._clients_snapshot = None
+        self._streams_snapshot = None
 
     def synchronize(self, status):
         """Synchronize snapserver."""
-        self._version = status['server']['server']['snapserver']['version']
-        new_groups = {}
-        new_clients = {}
-        new_streams = {}
-        for stream in status.get('server').get('streams'):
-            if stream.get('id') in self._streams:
-                new_streams[stream.get('id')] = self._streams[stream.get('id')]
-                new_streams[stream.get('id')].update(stream)
+        self._flush_pending()
+        server = status['server']
+        server_version = server['server']['snapserver']['version']
+        if server_version != self._version:
+            self._version = server_version
+            parsed_version = _parse_version(server_version)
+            self._unsupported_methods = frozenset(
+                method for method, required in _PARSED_VERSIONS.items()
+                if parsed_version < required)
+        seen_groups = set()
+        seen_clients = set()
+        seen_streams = set()
+        stream_groups = {}
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        streams, groups, clients = self._streams, self._groups, self._clients
+        for data in server['streams']:
+            identifier = data.get('id')
+            seen_streams.add(identifier)
+            if (stream := streams.get(identifier)) is not None:
+                stream.update(data)
             else:
-                new_streams[stream.get('id')] = Snapstream(stream)
-            _LOGGER.debug('stream found: %s', new_streams[stream.get('id')])
-        for group in status.get('server').get('groups'):
-            if group.get('id') in self._groups:
-                new_groups[group.get('id')] = self._groups[group.get('id')]
-                new_groups[group.get('id')].update(group)
+                stream = streams[identifier] = Snapstream(data)
+            if debug:
+                _LOGGER.debug('stream found: %s', stream)
+        for data in server['groups']:
+            identifier = data.get('id')
+            seen_groups.add(identifier)
+            if (group := groups.get(identifier)) is not None:
+                group.update(data)
             else:
-                new_groups[group.get('id')] = Snapgroup(self, group)
-            for client in group.get('clients'):
-                if client.get('id') in self._clients:
-                    new_clients[client.get('id')] = self._clients[client.get('id')]
-                    new_clients[client.get('id')].update(client)
+                group = groups[identifier] = Snapgroup(self, data)
+            stream_groups.setdefault(data.get('stream_id'), {})[identifier] = None
+            for client_data in data['clients']:
+                client_identifier = client_data.get('id')
+                seen_clients.add(client_identifier)
+                if (client := clients.get(client_identifier)) is not None:
+                    client.update(client_data)
                 else:
-                    new_clients[client.get('id')] = Snapclient(self, client)
-                _LOGGER.debug('client found: %s', new_clients[client.get('id')])
-            _LOGGER.debug('group found: %s', new_groups[group.get('id')])
-        self._groups = new_groups
-        self._clients = new_clients
-        self._streams = new_streams
+                    client = clients[client_identifier] = Snapclient(self, client_data)
+                if debug:
+                    _LOGGER.debug('client found: %s', client)
+            if debug:
+                _LOGGER.debug('group found: %s', group)
+        for identifier in streams.keys() - seen_streams:
+            del streams[identifier]
+        for identifier in groups.keys() - seen_groups:
+            del groups[identifier]
+        for identifier in clients.keys() - seen_clients:
+            del clients[identifier]
+        self._stream_groups = stream_groups
+        self._invalidate_snapshots()
+        self._last_status = status
+
+    def _index_group_stream(self, group_identifier, stream_identifier):
+        """Move a group to a stream in the stream to groups index."""
+        for groups in self._stream_groups.values():
+            groups.pop(group_identifier, None)
+        self._stream_groups.setdefault(stream_identifier, {})[group_identifier] = None
+
+    def _groups_of_stream(self, stream_identifier):
+        """Get the groups playing a stream."""
+        return [self._groups[group_identifier]
+                for group_identifier in self._stream_groups.get(stream_identifier, ())
+                if group_identifier in self._groups]
 
     # pylint: disable=too-many-arguments
     async def _request(self, method, identifier, key=None, value=None, parameters=None):
@@ -330,21 +521,29 @@ class Snapserver():
         if isinstance(parameters, dict):
             params.update(parameters)
         result, error = await self._transact(method, params)
-        if isinstance(result, dict) and key in result:
-            return result.get(key)
-        return result or error
+        return _response(result, error, key)
+
+    async def _request_value(self, method, identifier, key, value):
+        """Perform request setting a single value, a None value is left out."""
+        if value is None:
+            params = {'id': identifier}
+        else:
+            params = {'id': identifier, key: value}
+        result, error = await self._transact(method, params)
+        return _response(result, error, key)
 
     def _on_server_connect(self):
         """Handle server connection."""
         _LOGGER.debug('Server connected')
-        if self._on_connect_callback_func and callable(self._on_connect_callback_func):
-            self._on_connect_callback_func()
+        self._reconnect_attempt = 0
+        self._on_connect_callback_func()
 
     def _on_server_disconnect(self, exception):
         """Handle server disconnection."""
+        self._is_connected = False
+        self._pending_reads = {}
         _LOGGER.debug('Server disconnected: %s', str(exception))
-        if self._on_disconnect_callback_func and callable(self._on_disconnect_callback_func):
-            self._on_disconnect_callback_func(exception)
+        self._on_disconnect_callback_func(exception)
         self._protocol = None
         self._transport = None
         if (not self._is_stopped) and self._reconnect:
@@ -352,121 +551,245 @@ class Snapserver():
 
     def _on_server_update(self, data):
         """Handle server update."""
-        self.synchronize(data)
-        if self._on_update_callback_func and callable(self._on_update_callback_func):
-            self._on_update_callback_func()
+        self._flush_stream_properties()
+        # coalesce bursts of updates into a single synchronize
+        self._pending_status = data
+        if self._synchronize_handle is None:
+            self._synchronize_handle = self._loop.call_soon(self._do_synchronize)
+
+    def _flush_server_update(self):
+        """Apply a pending server update now."""
+        if self._synchronize_handle is not None:
+            self._synchronize_handle.cancel()
+            self._do_synchronize()
+
+    def _flush_stream_properties(self):
+        """Apply pending stream properties updates now."""
+        if self._properties_handle is not None:
+            self._properties_handle.cancel()
+            self._do_stream_properties()
+
+    def _flush_pending(self):
+        """Apply all pending coalesced updates now."""
+        self._flush_server_update()
+        self._flush_stream_properties()
+
+    def _on_event(self, handler, data):
+        """Handle an event after any pending coalesced updates."""
+        self._flush_pending()
+        self._last_status = None
+        handler(data)
+
+    def _do_synchronize(self):
+        """Synchronize with the latest server update."""
+        status = self._pending_status
+        self._pending_status = None
+        self._synchronize_handle = None
+        # the server also announces changes already applied from a response
+        if status == self._last_status:
+            return
+        self.synchronize(status)
+        self._on_update_callback_func()
 
     def _on_group_mute(self, data):
         """Handle group mute."""
-        group = self._groups.get(data.get('id'))
-        group.update_mute(data)
-        for client_id in group.clients:
-            self._clients.get(client_id).callback()
+        if (group := self._groups.get(data.get('id'))) is not None:
+            group.update_mute(data)
+            self._notify_clients(group.clients)
+        else:
+            self._on_unknown('group', data.get('id'))
 
     def _on_group_name_changed(self, data):
         """Handle group name changed."""
-        self._groups.get(data.get('id')).update_name(data)
+        if (group := self._groups.get(data.get('id'))) is not None:
+            group.update_name(data)
+        else:
+            self._on_unknown('group', data.get('id'))
 
     def _on_group_stream_changed(self, data):
         """Handle group stream change."""
-        group = self._groups.get(data.get('id'))
-        group.update_stream(data)
-        for client_id in group.clients:
-            self._clients.get(client_id).callback()
+        if (group := self._groups.get(data.get('id'))) is not None:
+            self._index_group_stream(group.identifier, data.get('stream_id'))
+            group.update_stream(data)
+            self._notify_clients(group.clients)
+        else:
+            self._on_unknown('group', data.get('id'))
+
+    def _notify_clients(self, client_ids):
+        """Schedule the callbacks of clients, once per client per loop iteration."""
+        if self._client_callbacks_handle is None:
+            self._client_callbacks_handle = self._loop.call_soon(self._do_client_callbacks)
+        self._pending_client_ids.update(dict.fromkeys(client_ids))
+
+    def _do_client_callbacks(self):
+        """Run the callbacks of notified clients, then the clients changed callback once."""
+        client_ids = self._pending_client_ids
+        self._pending_client_ids = {}
+        self._client_callbacks_handle = None
+        clients = self._clients
+        notified = [client_id for client_id in client_ids if client_id in clients]
+        for client_id in notified:
+            clients[client_id].callback()
+        if notified:
+            self._on_clients_changed_callback_func(notified)
+
+    def _notify_stream_groups(self, stream_identifier):
+        """Run the callbacks of the groups playing a stream and of their clients."""
+        client_ids = []
+        for group in self._groups_of_stream(stream_identifier):
+            group.callback()
+            client_ids.extend(group.clients)
+        self._notify_clients(client_ids)
 
     def _on_client_connect(self, data):
         """Handle client connect."""
-        client = None
-        if data.get('id') in self._clients:
-            client = self._clients[data.get('id')]
+        identifier = data.get('id')
+        client = self._clients.get(identifier)
+        if client is not None:
             client.update_connected(True)
         else:
             client = Snapclient(self, data.get('client'))
-            self._clients[data.get('id')] = client
-            if self._new_client_callback_func and callable(self._new_client_callback_func):
-                self._new_client_callback_func(client)
-        _LOGGER.debug('client %s connected', client.friendly_name)
+            self._clients[identifier] = client
+            self._clients_snapshot = None
+            self._new_client_callback_func(client)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('client %s connected', client.friendly_name)
 
     def _on_client_disconnect(self, data):
         """Handle client disconnect."""
-        self._clients[data.get('id')].update_connected(False)
-        _LOGGER.debug('client %s disconnected', self._clients[data.get('id')].friendly_name)
+        if (client := self._clients.get(data.get('id'))) is not None:
+            client.update_connected(False)
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug('client %s disconnected', client.friendly_name)
+        else:
+            self._on_unknown('client', data.get('id'))
 
     def _on_client_volume_changed(self, data):
         """Handle client volume change."""
-        self._clients.get(data.get('id')).update_volume(data)
+        if (client := self._clients.get(data.get('id'))) is not None:
+            volume = data.get('volume', {})
+            # ignore volume broadcasts which do not change anything
+            if (volume.get('percent') != client.volume
+                    or volume.get('muted') != client.muted):
+                client.update_volume(data)
+        else:
+            self._on_unknown('client', data.get('id'))
 
     def _on_client_name_changed(self, data):
         """Handle client name changed."""
-        self._clients.get(data.get('id')).update_name(data)
+        if (client := self._clients.get(data.get('id'))) is not None:
+            if data.get('name') != client.name:
+                client.update_name(data)
+        else:
+            self._on_unknown('client', data.get('id'))
 
     def _on_client_latency_changed(self, data):
         """Handle client latency changed."""
-        self._clients.get(data.get('id')).update_latency(data)
+        if (client := self._clients.get(data.get('id'))) is not None:
+            if data.get('latency') != client.latency:
+                client.update_latency(data)
+        else:
+            self._on_unknown('client', data.get('id'))
 
     def _on_stream_meta(self, data):  # deprecated
         """Handle stream metadata update."""
-        if stream := self._streams.get(data.get('id')):
+        identifier = data.get('id')
+        if (stream := self._streams.get(identifier)) is not None:
             stream.update_meta(data.get('meta'))
-            _LOGGER.debug('stream %s metadata updated', stream.friendly_name)
-            for group in self._groups.values():
-                if group.stream == data.get('id'):
-                    group.callback()
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug('stream %s metadata updated', stream.friendly_name)
+            for group in self._groups_of_stream(identifier):
+                group.callback()
+
+    def _queue_stream_properties(self, data):
+        """Queue a stream properties update."""
+        self._flush_server_update()
+        # coalesce bursts of properties updates into one update per stream
+        if self._properties_handle is None:
+            self._properties_handle = self._loop.call_soon(self._do_stream_properties)
+        self._pending_properties[data.get('id')] = data
+
+    def _do_stream_properties(self):
+        """Apply the latest properties update of each stream."""
+        pending = self._pending_properties
+        self._pending_properties = {}
+        self._properties_handle = None
+        for data in pending.values():
+            self._on_stream_properties(data)
 
     def _on_stream_properties(self, data):
         """Handle stream properties update."""
-        if stream := self._streams.get(data.get('id')):
+        identifier = data.get('id')
+        if (stream := self._streams.get(identifier)) is not None:
             stream.update_properties(data.get('properties'))
-            _LOGGER.debug('stream %s properties updated', stream.friendly_name)
-            for group in self._groups.values():
-                if group.stream == data.get('id'):
-                    group.callback()
-                    for client_id in group.clients:
-                        self._clients.get(client_id).callback()
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug('stream %s properties updated', stream.friendly_name)
+            self._notify_stream_groups(identifier)
 
     def _on_stream_update(self, data):
         """Handle stream update."""
-        if data.get('id') in self._streams:
-            self._streams[data.get('id')].update(data.get('stream'))
-            _LOGGER.debug('stream %s updated', self._streams[data.get('id')].friendly_name)
-            self._streams[data.get("id")].callback()
-            for group in self._groups.values():
-                if group.stream == data.get('id'):
-                    group.callback()
-                    for client_id in group.clients:
-                        self._clients.get(client_id).callback()
+        identifier = data.get('id')
+        if (stream := self._streams.get(identifier)) is not None:
+            stream.update(data.get('stream'))
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug('stream %s updated', stream.friendly_name)
+            stream.callback()
+            self._notify_stream_groups(identifier)
         else:
-            if data.get('stream', {}).get('uri', {}).get('query', {}).get('codec') == 'null':
-                _LOGGER.debug('stream %s is input-only, ignore', data.get('id'))
+            try:
+                codec = data['stream']['uri']['query']['codec']
+            except (KeyError, TypeError):
+                codec = None
+            if codec == 'null':
+                _LOGGER.debug('stream %s is input-only, ignore', identifier)
             else:
-                _LOGGER.info('stream %s not found, synchronize', data.get('id'))
-
-                async def async_sync():
-                    self.synchronize((await self.status())[0])
-                asyncio.ensure_future(async_sync())
+                self._on_unknown('stream', identifier)
+
+    def _on_unknown(self, kind, identifier):
+        """Synchronize after an event for an unknown object, one fetch at a time."""
+        _LOGGER.info('%s %s not found, synchronize', kind, identifier)
+        if self._resync_task is None:
+            self._resync_task = self._loop.create_task(self._resynchronize())
+
+    async def _resynchronize(self):
+        """Fetch the status and synchronize, one fetch at a time."""
+        try:
+            status, _ = await self.status()
+            if isinstance(status, dict) and 'server' in status:
+                self.synchronize(status)
+        finally:
+            self._resync_task = None
 
     def set_on_update_callback(self, func):
         """Set on update callback function."""
-        self._on_update_callback_func = func
+        self._on_update_callback_func = func if callable(func) else _noop
 
     def set_on_connect_callback(self, func):
         """Set on connection callback function."""
-        self._on_connect_callback_func = func
+        self._on_connect_callback_func = func if callable(func) else _noop
 
     def set_on_disconnect_callback(self, func):
         """Set on disconnection callback function."""
-        self._on_disconnect_callback_func = func
+        self._on_disconnect_callback_func = func if callable(func) else _noop
 
     def set_new_client_callback(self, func):
         """Set new client callback function."""
-        self._new_client_callback_func = func
+        self._new_client_callback_func = func if callable(func) else _noop
+
+    def set_on_clients_changed_callback(self, func):
+        """Set clients changed callback function, called with a list of client ids.
+
+        It runs on the loop iteration after group or stream events, once the
+        callbacks of the notified clients have run.
+        """
+        self._on_clients_changed_callback_func = func if callable(func) else _noop
 
     def __repr__(self):
         """Return string representation."""
         return f'Snapserver {self.version} ({self._host})'
 
     def _version_check(self, api_call):
-        if version.parse(self.version) < version.parse(_VERSIONS.get(api_call)):
+        if api_call in self._unsupported_methods:
             raise ServerVersionError(
                 f"{api_call} requires server version >= {_VERSIONS[api_call]}."
                 + f" Current version is {self.version}"
@@ -4,6 +4,8 @@
 class Snapstream():
     """Represents a snapcast stream."""
 
+    __slots__ = ('_callback_func', '_stream')
+
     def __init__(self, data):
         """Initialize."""
         self.update(data)
@@ -27,7 +29,7 @@ class Snapstream():
     @property
     def friendly_name(self):
         """Get friendly name."""
-        return self.name if self.name != '' else self.identifier
+        return self.name or self.identifier
 
     @property
     def metadata(self):
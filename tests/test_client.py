@@ -36,6 +36,11 @@ class TestSnapclient(unittest.TestCase):
         server.groups = ['test_group']
         self.client = Snapclient(server, data)
 
+    def test_slots(self):
+        self.assertFalse(hasattr(self.client, '__dict__'))
+        for name in Snapclient.__slots__:
+            getattr(self.client, name)
+
     @mock.patch.object(Snapclient, 'group', new=1)
     def test_init(self):
         self.assertEqual(self.client.identifier, 'test')
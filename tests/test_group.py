@@ -35,6 +35,11 @@ class TestSnapgroup(unittest.TestCase):
         server.clients = [client]
         self.group = Snapgroup(server, data)
 
+    def test_slots(self):
+        self.assertFalse(hasattr(self.group, '__dict__'))
+        for name in Snapgroup.__slots__:
+            getattr(self.group, name)
+
     def test_init(self):
         self.assertEqual(self.group.identifier, 'test')
         self.assertEqual(self.group.name, '')
@@ -60,10 +65,15 @@ class TestSnapgroup(unittest.TestCase):
 
     def test_set_volume(self):
         async_run(self.group.set_volume(75))
+        client = self.group._server.client('a')
+        self.assertEqual(client.set_volume.await_count, 2)
+        client.set_volume.assert_awaited_with(75, update_group=False)
+        self.assertEqual(client.update_volume.call_count, 2)
 
     def test_set_stream(self):
         async_run(self.group.set_stream('new stream'))
         self.assertEqual(self.group.stream, 'new stream')
+        self.group._server.group_stream.assert_awaited_with('test', 'new stream')
 
     def test_set_name(self):
         async_run(self.group.set_name('test'))
@@ -0,0 +1,205 @@
+import asyncio
+import importlib.util
+import json
+import sys
+import unittest
+from unittest import mock
+from unittest.mock import MagicMock
+
+from snapcast.control.protocol import (SnapcastProtocol, jsonrpc_request, BATCH_SIZE,
+                                       SERVER_ONDISCONNECT, _loads)
+
+
+class TestSnapcastProtocol(unittest.TestCase):
+
+    def setUp(self):
+        self.callback = MagicMock()
+        self.on_disconnect = MagicMock()
+        self.transport = MagicMock()
+        self.protocol = SnapcastProtocol({
+            'Test.OnNotify': self.callback,
+            SERVER_ONDISCONNECT: self.on_disconnect
+        })
+        self.protocol.connection_made(self.transport)
+
+    def _written(self):
+        requests = []
+        for call in self.transport.write.call_args_list:
+            request = json.loads(call.args[0])
+            requests.extend(request if isinstance(request, list) else [request])
+        return requests
+
+    @staticmethod
+    async def _flush():
+        # let the requests run, then let the protocol write its batch
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    def _respond(self, responses):
+        self.protocol.data_received(json.dumps(responses).encode() + b'\r\n')
+
+    def test_jsonrpc_request(self):
+        request = jsonrpc_request('Test.Method', 1, {'id': 'test'})
+        self.assertTrue(request.endswith(b'\r\n'))
+        self.assertDictEqual(json.loads(request), {
+            'id': 1,
+            'method': 'Test.Method',
+            'params': {'id': 'test'},
+            'jsonrpc': '2.0'
+        })
+
+    def test_jsonrpc_request_no_params(self):
+        for params in (None, {}):
+            request = json.loads(jsonrpc_request('Test.Method', 2, params))
+            self.assertDictEqual(request['params'], {})
+
+    def test_loads_memoryview(self):
+        data = bytearray(b'xx{"id": 1}\r\n')
+        self.assertEqual(_loads(memoryview(data)[2:-2]), {'id': 1})
+
+    def test_stdlib_json_fallback(self):
+        spec = importlib.util.find_spec('snapcast.control.protocol')
+        module = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(sys.modules, {'orjson': None}):
+            spec.loader.exec_module(module)
+        self.assertEqual(module._dumps.__module__, module.__name__)
+        request = module.jsonrpc_request('Test.Method', 1, {'id': 'test'})
+        self.assertEqual(json.loads(request)['params'], {'id': 'test'})
+        self.assertEqual(module._loads(memoryview(b'{"id": 1}')), {'id': 1})
+
+    def test_notification(self):
+        self.protocol.data_received(b'{"method": "Test.OnNotify", "params": {"id": "a"}}\r\n')
+        self.callback.assert_called_once_with({'id': 'a'})
+
+    def test_notification_split(self):
+        data = b'{"method": "Test.OnNotify", "params": {"id": "a"}}\r\n' * 2
+        for i in range(0, len(data), 5):
+            self.protocol.data_received(data[i:i + 5])
+        self.assertEqual(self.callback.call_count, 2)
+
+    def test_notification_partial_tail(self):
+        self.protocol.data_received(b'{"method": "Test.OnNotify", "params": 1}\r\n'
+                                    b'{"method": "Test.OnNot')
+        self.callback.assert_called_once_with(1)
+        self.protocol.data_received(b'ify", "params": 2}\r\n')
+        self.callback.assert_called_with(2)
+
+    def test_notification_batch(self):
+        self.protocol.data_received(b'[{"method": "Test.OnNotify", "params": 1}, '
+                                    b'{"method": "Test.OnNotify", "params": 2}]\r\n')
+        self.assertEqual([call.args[0] for call in self.callback.call_args_list], [1, 2])
+
+    def test_notification_burst(self):
+        self.protocol.data_received(b'{"method": "Test.OnNotify", "params": 1}\r\n\r\n'
+                                    b'[{"method": "Test.OnNotify", "params": 2}]\r\n'
+                                    b'{"method": "Test.OnNotify", "params": 3}\r\n')
+        self.assertEqual([call.args[0] for call in self.callback.call_args_list], [1, 2, 3])
+
+    def test_request(self):
+        async def run():
+            task = asyncio.ensure_future(self.protocol.request('Test.Method', {}))
+            await self._flush()
+            identifier = self._written()[0]['id']
+            self.protocol.data_received(
+                json.dumps({'id': identifier, 'result': 'ok'}).encode() + b'\r\n')
+            return await task
+        self.assertEqual(asyncio.run(run()), ('ok', None))
+
+    def test_response_unknown_id(self):
+        self.protocol.data_received(b'{"id": 12345, "result": "stale"}\r\n')
+        self.protocol.data_received(b'{"method": "Test.OnNotify", "params": 1}\r\n')
+        self.callback.assert_called_once_with(1)
+
+    def test_request_unique_ids(self):
+        async def run():
+            tasks = [asyncio.ensure_future(self.protocol.request('Test.Method', {}))
+                     for _ in range(50)]
+            await self._flush()
+            for request in reversed(self._written()):
+                self.protocol.data_received(json.dumps(
+                    {'id': request['id'], 'result': request['id']}).encode() + b'\r\n')
+            return await asyncio.gather(*tasks)
+        results = asyncio.run(run())
+        self.assertEqual(len(set(results)), 50)
+        self.assertEqual([result for result, _ in results], [r['id'] for r in self._written()])
+
+    def test_request_batch(self):
+        async def run():
+            tasks = [asyncio.ensure_future(self.protocol.request('Test.Method', {'id': i}))
+                     for i in range(BATCH_SIZE + 1)]
+            await self._flush()
+            writes = [json.loads(call.args[0]) for call in self.transport.write.call_args_list]
+            self.assertEqual(len(writes), 2)
+            self.assertEqual(len(writes[0]), BATCH_SIZE)
+            self.assertIsInstance(writes[1], dict)
+            self._respond([{'id': request['id'], 'result': request['params']['id']}
+                           for request in reversed(writes[0])])
+            self._respond({'id': writes[1]['id'], 'result': BATCH_SIZE})
+            return await asyncio.gather(*tasks)
+        results = asyncio.run(run())
+        self.assertEqual(results, [(i, None) for i in range(BATCH_SIZE + 1)])
+
+    def test_request_batch_per_tick(self):
+        async def run():
+            first = [asyncio.ensure_future(self.protocol.request('Test.Method', {}))
+                     for _ in range(2)]
+            await self._flush()
+            self.assertEqual(self.transport.write.call_count, 1)
+            second = asyncio.ensure_future(self.protocol.request('Test.Method', {}))
+            await self._flush()
+            self.assertEqual(self.transport.write.call_count, 2)
+            for request in self._written():
+                self._respond({'id': request['id'], 'result': 'ok'})
+            return await asyncio.gather(*first, second)
+        self.assertEqual(asyncio.run(run()), [('ok', None)] * 3)
+
+    def test_request_batch_error(self):
+        error = {'code': -32600, 'message': 'Invalid Request'}
+
+        async def run():
+            tasks = [asyncio.ensure_future(self.protocol.request('Test.Method', {}))
+                     for _ in range(2)]
+            await self._flush()
+            self._respond({'id': None, 'error': error})
+            return await asyncio.gather(*tasks)
+        self.assertEqual(asyncio.run(run()), [(None, error)] * 2)
+
+    def test_request_batch_error_ambiguous(self):
+        error = {'code': -32600, 'message': 'Invalid Request'}
+
+        async def run():
+            first = [asyncio.ensure_future(self.protocol.request('Test.Method', {}))
+                     for _ in range(2)]
+            await self._flush()
+            second = [asyncio.ensure_future(self.protocol.request('Test.Method', {}))
+                      for _ in range(2)]
+            await self._flush()
+            # two batches are waiting, the error cannot be attributed to either
+            with self.assertLogs('snapcast.control.protocol', 'WARNING'):
+                self._respond({'id': None, 'error': error})
+            self._respond([{'id': request['id'], 'result': 'ok'}
+                           for request in self._written()])
+            return await asyncio.gather(*first, *second)
+        self.assertEqual(asyncio.run(run()), [('ok', None)] * 4)
+
+    def test_request_cancelled(self):
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.protocol.request('Test.Method', {}), 0)
+        asyncio.run(run())
+        self.assertEqual(self.protocol._buffer, {})
+
+    def test_connection_lost(self):
+        async def run():
+            task = asyncio.ensure_future(self.protocol.request('Test.Method', {}))
+            future = self.protocol.send('Test.Method', {})
+            await self._flush()
+            self.protocol.connection_lost(None)
+            self.assertEqual(self.protocol._buffer, {})
+            self.assertEqual(future.result()[1]['code'], -1)
+            return await task
+        result, error = asyncio.run(run())
+        self.assertIsNone(result)
+        self.assertEqual(error['code'], -1)
+        self.assertEqual(self.protocol._buffer, {})
+        self.on_disconnect.assert_called_once_with(None)
@@ -1,11 +1,17 @@
 import asyncio
 import copy
+import json
+import logging
+import socket
 import unittest
 from unittest import mock
 from unittest.mock import AsyncMock, MagicMock
 
-from snapcast.control.server import Snapserver
+from snapcast.control.server import (
+    Snapserver, ServerVersionError, _EVENTS, _METHODS, _parse_version)
 from snapcast.control import create_server
+from snapcast.control.client import Snapclient
+from snapcast.control.protocol import SnapcastProtocol
 
 
 SERVER_STATUS = {
@@ -152,7 +158,7 @@ class TestSnapserver(unittest.TestCase):
     @mock.patch.object(Snapserver, 'status', new=AsyncMock(
         return_value=(None, {"code": -1, "message": "failed"})))
     @mock.patch.object(Snapserver, '_do_connect', new=AsyncMock())
-    @mock.patch.object(Snapserver, 'stop', new=mock.MagicMock())
+    @mock.patch.object(Snapserver, '_stop', new=mock.MagicMock())
     def test_start_fail(self):
         with self.assertRaises(OSError):
             self._run(self.server.start())
@@ -163,6 +169,18 @@ class TestSnapserver(unittest.TestCase):
         self.server._version = None
         self._run(self.server.start())
         self.assertEqual(self.server.version, '0.26.0')
+        self.server.stop()
+        self.assertFalse(self.server._is_connected)
+
+    def test_events_methods(self):
+        self.assertIsInstance(_EVENTS, frozenset)
+        self.assertIsInstance(_METHODS, frozenset)
+        self.assertLessEqual(_EVENTS, set(self.server._callbacks))
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.server, '__dict__'))
+        for name in Snapserver.__slots__:
+            getattr(self.server, name)
 
     def test_init(self):
         self.assertEqual(self.server.version, '0.26.0')
@@ -178,6 +196,83 @@ class TestSnapserver(unittest.TestCase):
         status, _ = self._run(self.server.status())
         self.assertEqual(status['server']['server']['snapserver']['version'], '0.26.0')
 
+    def test_not_connected(self):
+        result, error = self._run(self.server.status())
+        self.assertIsNone(result)
+        self.assertEqual(error, {"code": None, "message": "Server not connected"})
+        self.assertIs(self._run(self.server.client_name('test', 'name')), error)
+
+    def test_connected_skips_transport(self):
+        self.server._is_connected = True
+        self.server._transport = mock.MagicMock()
+        self.server._protocol = mock.MagicMock()
+        self.server._protocol.request = AsyncMock(return_value=({}, None))
+        self.assertEqual(self._run(self.server.client_name('test', 'new')), {})
+        self.server._transport.is_closing.assert_not_called()
+        self.server._protocol.request.assert_called_once_with(
+            'Client.SetName', {'id': 'test', 'name': 'new'})
+
+    def test_concurrent_reads_shared(self):
+        self.server._is_connected = True
+        self.server._protocol = mock.MagicMock()
+
+        async def run():
+            future = asyncio.get_running_loop().create_future()
+            self.server._protocol.send.return_value = future
+            tasks = [asyncio.ensure_future(self.server.status()) for _ in range(3)]
+            client = asyncio.ensure_future(self.server.client_status('test'))
+            await asyncio.sleep(0)
+            tasks[0].cancel()
+            await asyncio.sleep(0)
+            future.set_result(({'client': 'ok'}, None))
+            results = await asyncio.gather(*tasks[1:], client)
+            self.assertTrue(tasks[0].cancelled())
+            return results
+        results = self._run(run())
+        self.assertEqual(results[:2], [({'client': 'ok'}, None)] * 2)
+        self.assertEqual(results[2], 'ok')
+        self.assertEqual(self.server._protocol.send.call_args_list, [
+            mock.call('Server.GetStatus', None),
+            mock.call('Client.GetStatus', {'id': 'test'})])
+        self.assertEqual(self.server._pending_reads, {})
+
+    def test_read_after_write_not_shared(self):
+        self.server._is_connected = True
+        self.server._protocol = mock.MagicMock()
+        self.server._protocol.request = AsyncMock(return_value=({}, None))
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            futures = [loop.create_future(), loop.create_future()]
+            self.server._protocol.send.side_effect = futures
+            before = asyncio.ensure_future(self.server.status())
+            await asyncio.sleep(0)
+            await self.server.group_clients('test', ['test'])
+            after = asyncio.ensure_future(self.server.status())
+            await asyncio.sleep(0)
+            futures[0].set_result(('before', None))
+            futures[1].set_result(('after', None))
+            return await asyncio.gather(before, after)
+        self.assertEqual(self._run(run()), [('before', None), ('after', None)])
+        self.assertEqual(self.server._protocol.send.call_count, 2)
+
+    def test_request_falsy_result(self):
+        async def transact(_server, method, params):
+            return ({}, None)
+        with mock.patch.object(Snapserver, '_transact', new=transact):
+            self.assertEqual(self._run(self.server.group_status('test')), {})
+
+    def test_request_value(self):
+        calls = []
+        async def transact(_server, method, params):
+            calls.append((method, params))
+            return ({'name': 'new'}, None)
+        with mock.patch.object(Snapserver, '_transact', new=transact):
+            self.assertEqual(self._run(self.server.client_name('test', 'new')), 'new')
+            self._run(self.server.group_stream('test', None))
+        self.assertEqual(calls, [('Client.SetName', {'id': 'test', 'name': 'new'}),
+                                 ('Group.SetStream', {'id': 'test'})])
+
     @mock.patch.object(Snapserver, '_transact', new=mock_transact('Server.GetRPCVersion'))
     def test_rpc_version(self):
         version, _ = self._run(self.server.rpc_version())
@@ -204,6 +299,27 @@ class TestSnapserver(unittest.TestCase):
         self._run(self.server.delete_client('test'))
         self.assertEqual(len(self.server.clients), 0)
 
+    def test_delete_client_announced(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['groups'][0]['clients'] = []
+
+        async def transact(_server, method, params):
+            return (status, None)
+        with mock.patch.object(Snapserver, '_transact', new=transact):
+            self._run(self.server.delete_client('test'))
+        cb = mock.MagicMock()
+        self.server.set_on_update_callback(cb)
+        with mock.patch.object(Snapserver, 'synchronize') as synchronize:
+            self.server._on_server_update(copy.deepcopy(status))
+            self.server._do_synchronize()
+            synchronize.assert_not_called()
+            cb.assert_not_called()
+            # any other event may have changed the state behind the last status
+            self.server._callbacks['Group.OnNameChanged']({'id': 'test', 'name': 'name'})
+            self.server._on_server_update(copy.deepcopy(status))
+            self.server._do_synchronize()
+            synchronize.assert_called_once()
+
     @mock.patch.object(Snapserver, '_transact', new=mock_transact('Group.GetStatus'))
     def test_group_status(self):
         result = self._run(self.server.group_status('test'))
@@ -246,24 +362,283 @@ class TestSnapserver(unittest.TestCase):
         result = self._run(self.server.stream_remove_stream('stream 2'))
         self.assertDictEqual(result, {'id': 'stream 2'})
 
+    @mock.patch.object(Snapserver, '_transact', new=mock_transact('Stream.AddStream'))
+    @mock.patch.object(Snapserver, 'status', new=AsyncMock())
+    def test_stream_addstream_known(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['streams'].append(
+            {'id': 'stream 2', 'status': 'idle', 'uri': {'query': {'name': 'stream 2'}}})
+        self.server.synchronize(status)
+        self._run(self.server.stream_add_stream('pipe:///tmp/test?name=stream 2'))
+        Snapserver.status.assert_not_called()
+
+    def test_stream_addstream_unknown(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['streams'].append(
+            {'id': 'stream 2', 'status': 'idle', 'uri': {'query': {'name': 'stream 2'}}})
+        methods = []
+
+        async def transact(_server, method, params=None):
+            methods.append(method)
+            if method == 'Stream.AddStream':
+                return ({'id': 'stream 2'}, None)
+            return (status, None)
+        with mock.patch.object(Snapserver, '_transact', new=transact):
+            result = self._run(self.server.stream_add_stream('pipe:///tmp/test?name=stream 2'))
+        self.assertEqual(result, {'id': 'stream 2'})
+        self.assertEqual(methods, ['Stream.AddStream', 'Server.GetStatus'])
+        self.assertEqual(self.server.stream('stream 2').status, 'idle')
+
+    @mock.patch.object(Snapserver, 'status', new=AsyncMock())
+    def test_stream_addstream_error(self):
+        error = {'code': -32603, 'message': 'failed'}
+        async def transact(_server, method, params):
+            return (None, error)
+        with mock.patch.object(Snapserver, '_transact', new=transact):
+            self.assertEqual(self._run(self.server.stream_add_stream('pipe:///x')), error)
+        Snapserver.status.assert_not_called()
+
+    @mock.patch.object(Snapserver, 'status', new=AsyncMock())
+    def test_stream_removestream_local(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['groups'][0]['stream_id'] = 'stream'
+        status['server']['streams'].append(
+            {'id': 'stream 2', 'status': 'idle', 'uri': {'query': {'name': 'stream 2'}}})
+        self.server.synchronize(status)
+
+        async def transact(_server, method, params):
+            return ({'id': 'stream 2'}, None)
+        with mock.patch.object(Snapserver, '_transact', new=transact):
+            self._run(self.server.stream_remove_stream('stream 2'))
+        self.assertEqual([stream.identifier for stream in self.server.streams], ['stream'])
+        self.assertNotIn('stream 2', self.server._stream_groups)
+        Snapserver.status.assert_not_called()
+
+    def test_stream_removestream_playing(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['groups'][0]['stream_id'] = 'stream'
+        self.server.synchronize(status)
+        after = copy.deepcopy(status)
+        after['server']['streams'][0]['id'] = 'other'
+        after['server']['groups'][0]['stream_id'] = 'other'
+
+        async def transact(_server, method, params):
+            return ({'id': 'stream'}, None)
+        with mock.patch.object(Snapserver, '_transact', new=transact), \
+                mock.patch.object(Snapserver, 'status',
+                                  new=AsyncMock(return_value=(after, None))) as status_mock:
+            self._run(self.server.stream_remove_stream('stream'))
+            status_mock.assert_awaited_once()
+        self.assertEqual(self.server.group('test').stream, 'other')
+        self.assertEqual(self.server._groups_of_stream('stream'), [])
+        self.assertEqual(self.server._groups_of_stream('other'), [self.server.group('test')])
+
     def test_synchronize(self):
         status = copy.deepcopy(return_values.get('Server.GetStatus'))
         status['server']['server']['snapserver']['version'] = '0.12'
         self.server.synchronize(status)
         self.assertEqual(self.server.version, '0.12')
 
+    @mock.patch.object(Snapserver, '_transact', new=mock_transact('Stream.SetProperty'))
+    def test_version_check(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['server']['snapserver']['version'] = '0.25.0'
+        self.server.synchronize(status)
+        with self.assertRaises(ServerVersionError):
+            self._run(self.server.stream_setproperty('stream', 'foo', 'bar'))
+        status['server']['server']['snapserver']['version'] = '0.26.0'
+        self.server.synchronize(status)
+        result = self._run(self.server.stream_setproperty('stream', 'foo', 'bar'))
+        self.assertEqual(result, 'ok')
+
+    def test_version_check_cached(self):
+        unsupported = self.server._unsupported_methods
+        self.assertEqual(unsupported, frozenset())
+        with mock.patch('snapcast.control.server._parse_version') as parse:
+            self.server.synchronize(return_values.get('Server.GetStatus'))
+            self.server._version_check('Stream.SetProperty')
+            parse.assert_not_called()
+        self.assertIs(self.server._unsupported_methods, unsupported)
+
+    def test_parse_version(self):
+        self.assertEqual(_parse_version('0.26.0'), (0, 26, 0))
+        self.assertEqual(_parse_version('0.27.0-beta.1'), (0, 27, 0))
+        self.assertEqual(_parse_version('0.12'), (0, 12, 0))
+        self.assertEqual(_parse_version('unknown'), ())
+        self.assertLess(_parse_version('0.9.0'), _parse_version('0.16.0'))
+
+    def test_version_check_message(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['server']['snapserver']['version'] = '0.25.0'
+        self.server.synchronize(status)
+        with self.assertRaisesRegex(ServerVersionError, r'>= 0\.26\.0.*is 0\.25\.0'):
+            self.server._version_check('Stream.SetProperty')
+
+    def test_version_check_short_version(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['server']['snapserver']['version'] = '0.15'
+        self.server.synchronize(status)
+        with self.assertRaises(ServerVersionError):
+            self.server._version_check('Group.SetName')
+        status['server']['server']['snapserver']['version'] = '0.16'
+        self.server.synchronize(status)
+        self.server._version_check('Group.SetName')
+        status['server']['server']['snapserver']['version'] = '0.16.0-beta'
+        self.server.synchronize(status)
+        self.server._version_check('Group.SetName')
+
+    def test_synchronize_schema_drift(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        del status['server']['streams']
+        with self.assertRaises(KeyError):
+            self.server.synchronize(status)
+
+    def test_synchronize_in_place(self):
+        client = self.server.client('test')
+        group = self.server.group('test')
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['streams'] = []
+        self.server.synchronize(status)
+        self.assertIs(self.server.client('test'), client)
+        self.assertIs(self.server.group('test'), group)
+        self.assertEqual(self.server.streams, ())
+
+    def test_synchronize_stream_added(self):
+        stream = self.server.stream('stream')
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        new = copy.deepcopy(status['server']['streams'][0])
+        new['id'] = 'new'
+        status['server']['streams'].append(new)
+        self.server.synchronize(status)
+        self.assertIs(self.server.stream('stream'), stream)
+        self.assertEqual(self.server.stream('new').identifier, 'new')
+        self.assertEqual(len(self.server.streams), 2)
+
+    def test_synchronize_client_moved(self):
+        client = self.server.client('test')
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        other = copy.deepcopy(status['server']['groups'][0])
+        other['id'] = 'other'
+        status['server']['groups'][0]['clients'] = []
+        status['server']['groups'].append(other)
+        self.server.synchronize(status)
+        self.assertIs(self.server.client('test'), client)
+        self.assertEqual(self.server.group('test').clients, [])
+        self.assertIs(client.group, self.server.group('other'))
+
+    def test_debug_logging_disabled(self):
+        logger = logging.getLogger('snapcast.control.server')
+        with mock.patch.object(logger, 'isEnabledFor', return_value=False), \
+                mock.patch.object(Snapclient, '__repr__') as client_repr, \
+                mock.patch.object(Snapclient, 'friendly_name',
+                                  new_callable=mock.PropertyMock) as friendly_name:
+            self.server.synchronize(copy.deepcopy(return_values.get('Server.GetStatus')))
+            self.server._on_client_disconnect({'id': 'test'})
+            client_repr.assert_not_called()
+            friendly_name.assert_not_called()
+
+    def test_callback_cleared(self):
+        cb = mock.MagicMock()
+        self.server.set_on_connect_callback(cb)
+        self.server.set_on_connect_callback(None)
+        self.server._on_server_connect()
+        self.server.set_on_connect_callback('not callable')
+        self.server._on_server_connect()
+        cb.assert_not_called()
+
     def test_on_server_connect(self):
         cb = mock.MagicMock()
         self.server.set_on_connect_callback(cb)
         self.server._on_server_connect()
         cb.assert_called_with()
 
+    @mock.patch('snapcast.control.server.random.uniform', new=lambda low, high: high)
+    def test_reconnect_delay(self):
+        delays = [self.server._reconnect_delay() for _ in range(6)]
+        self.assertEqual(delays, [5, 10, 20, 40, 60, 60])
+        self.server._on_server_connect()
+        self.assertEqual(self.server._reconnect_delay(), 5)
+        self.server._reconnect_delay()
+        self.server.stop()
+        self.assertEqual(self.server._reconnect_delay(), 5)
+
+    @mock.patch('snapcast.control.server.random.uniform', new=lambda low, high: low)
+    def test_reconnect_delay_jitter(self):
+        # equal jitter never retries sooner than half the backoff
+        self.assertEqual(self.server._reconnect_delay(), 2.5)
+
     def test_on_server_disconnect(self):
         cb = mock.MagicMock()
         self.server.set_on_disconnect_callback(cb)
         e = Exception()
+        self.server._is_connected = True
         self.server._on_server_disconnect(e)
         cb.assert_called_with(e)
+        self.assertFalse(self.server._is_connected)
+
+    def test_on_server_disconnect_reconnect(self):
+        self.server._reconnect = True
+        self.server._is_stopped = False
+        self.server._on_server_disconnect(None)
+        self.loop.create_task.assert_called_once()
+        self.loop.create_task.call_args.args[0].close()
+        task = self.loop.create_task.return_value
+        self.assertIn(task, self.server._background_tasks)
+        task.add_done_callback.assert_called_once_with(self.server._background_tasks.discard)
+
+    def test_do_connect_keepalive(self):
+        sock = MagicMock()
+        transport = MagicMock()
+        transport.get_extra_info.return_value = sock
+        self.loop.create_connection = AsyncMock(return_value=(transport, MagicMock()))
+        self._run(self.server._do_connect())
+        self.assertTrue(self.server._is_connected)
+        transport.get_extra_info.assert_called_once_with('socket')
+        sock.setsockopt.assert_any_call(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    @mock.patch.object(Snapserver, '_do_connect', new=AsyncMock(side_effect=OSError))
+    def test_reconnect_failed(self):
+        self.server._reconnect_cb()
+        self._run(self.loop.create_task.call_args.args[0])
+        self.loop.call_later.assert_called_once()
+        self.assertEqual(self.loop.call_later.call_args.args[1], self.server._reconnect_cb)
+
+    @mock.patch.object(Snapserver, '_do_connect',
+                       new=AsyncMock(side_effect=socket.gaierror('name resolution')))
+    def test_reconnect_failed_resolve(self):
+        self.server._reconnect_cb()
+        self._run(self.loop.create_task.call_args.args[0])
+        self.loop.call_later.assert_called_once()
+
+    @mock.patch('snapcast.control.server.random.uniform', new=lambda low, high: high)
+    @mock.patch.object(Snapserver, '_do_connect', new=AsyncMock(side_effect=OSError))
+    def test_reconnect_failed_backoff(self):
+        for _ in range(3):
+            self.server._reconnect_cb()
+            self._run(self.loop.create_task.call_args.args[0])
+        delays = [call.args[0] for call in self.loop.call_later.call_args_list]
+        self.assertEqual(delays, [5, 10, 20])
+
+    @mock.patch('snapcast.control.server.random.uniform', new=lambda low, high: high)
+    @mock.patch.object(Snapserver, '_do_connect', new=AsyncMock())
+    @mock.patch.object(Snapserver, 'status', new=AsyncMock(
+        return_value=(None, {"code": -1, "message": "failed"})))
+    def test_reconnect_invalid_status_backoff(self):
+        for _ in range(3):
+            self.server._reconnect_cb()
+            self._run(self.loop.create_task.call_args.args[0])
+        delays = [call.args[0] for call in self.loop.call_later.call_args_list]
+        self.assertEqual(delays, [5, 10, 20])
+
+    @mock.patch.object(Snapserver, '_transact', new=mock_transact('Server.GetStatus'))
+    @mock.patch.object(Snapserver, '_do_connect', new=AsyncMock())
+    def test_reconnect(self):
+        cb = mock.MagicMock()
+        self.server.set_on_connect_callback(cb)
+        self.server._reconnect_cb()
+        self._run(self.loop.create_task.call_args.args[0])
+        self.loop.call_later.assert_not_called()
+        cb.assert_called_once_with()
 
     def test_on_server_update(self):
         cb = mock.MagicMock()
@@ -271,9 +646,49 @@ class TestSnapserver(unittest.TestCase):
         status = copy.deepcopy(return_values.get('Server.GetStatus'))
         status['server']['server']['snapserver']['version'] = '0.12'
         self.server._on_server_update(status)
+        self.loop.call_soon.assert_called_once_with(self.server._do_synchronize)
+        self.server._do_synchronize()
         self.assertEqual(self.server.version, '0.12')
         cb.assert_called_with()
 
+    def test_on_server_update_coalesce(self):
+        cb = mock.MagicMock()
+        self.server.set_on_update_callback(cb)
+        for server_version in ('0.12', '0.13'):
+            status = copy.deepcopy(return_values.get('Server.GetStatus'))
+            status['server']['server']['snapserver']['version'] = server_version
+            self.server._on_server_update(status)
+        self.loop.call_soon.assert_called_once_with(self.server._do_synchronize)
+        self.server._do_synchronize()
+        self.assertEqual(self.server.version, '0.13')
+        cb.assert_called_once_with()
+
+    def test_on_server_update_ordering(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['groups'][0]['stream_id'] = 'stream'
+        protocol = SnapcastProtocol(self.server._callbacks)
+        protocol.data_received(
+            json.dumps({'method': 'Server.OnUpdate', 'params': status}).encode() + b'\r\n'
+            + json.dumps({'method': 'Group.OnStreamChanged',
+                          'params': {'id': 'test', 'stream_id': 'other'}}).encode() + b'\r\n')
+        self.assertIsNone(self.server._synchronize_handle)
+        self.assertEqual(self.server.group('test').stream, 'other')
+        self.assertEqual(self.server._groups_of_stream('other'), [self.server.group('test')])
+        self.assertEqual(self.server._groups_of_stream('stream'), [])
+
+    def test_synchronize_after_server_update(self):
+        cb = mock.MagicMock()
+        self.server.set_on_update_callback(cb)
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['server']['snapserver']['version'] = '0.12'
+        self.server._on_server_update(status)
+        fresh = copy.deepcopy(return_values.get('Server.GetStatus'))
+        fresh['server']['server']['snapserver']['version'] = '0.13'
+        self.server.synchronize(fresh)
+        cb.assert_called_once_with()
+        self.assertEqual(self.server.version, '0.13')
+        self.assertIsNone(self.server._synchronize_handle)
+
     def test_on_group_mute(self):
         data = {
             'id': 'test',
@@ -282,6 +697,32 @@ class TestSnapserver(unittest.TestCase):
         self.server._on_group_mute(data)
         self.assertEqual(self.server.group('test').muted, True)
 
+    def test_on_clients_changed(self):
+        client_cb = mock.MagicMock()
+        clients_cb = mock.MagicMock()
+        self.server.client('test').set_callback(client_cb)
+        self.server.set_on_clients_changed_callback(clients_cb)
+        self.server._on_group_mute({'id': 'test', 'mute': False})
+        self.server._on_group_mute({'id': 'test', 'mute': True})
+        self.loop.call_soon.assert_called_once_with(self.server._do_client_callbacks)
+        client_cb.assert_not_called()
+        self.server._do_client_callbacks()
+        client_cb.assert_called_once_with(self.server.client('test'))
+        clients_cb.assert_called_once_with(['test'])
+        clients_cb.reset_mock()
+        self.server._notify_clients(['unknown'])
+        self.server._do_client_callbacks()
+        clients_cb.assert_not_called()
+
+    def test_on_group_unknown(self):
+        self.server._on_group_mute({'id': 'unknown', 'mute': True})
+        self.server._on_group_name_changed({'id': 'unknown', 'name': 'name'})
+        self.server._on_group_stream_changed({'id': 'unknown', 'stream_id': 'stream'})
+        self.loop.call_soon.assert_not_called()
+        # one resynchronize picks up the unknown group
+        self.loop.create_task.assert_called_once()
+        self.loop.create_task.call_args.args[0].close()
+
     def test_on_group_stream_changed(self):
         data = {
             'id': 'test',
@@ -317,6 +758,24 @@ class TestSnapserver(unittest.TestCase):
         self.server._on_client_disconnect(data)
         self.assertEqual(self.server.client('test').connected, False)
 
+    def test_on_client_unknown(self):
+        data = {
+            'id': 'unknown',
+            'name': 'new',
+            'latency': 50,
+            'volume': {
+                'percent': 50,
+                'muted': True
+            }
+        }
+        self.server._on_client_disconnect(data)
+        self.server._on_client_volume_changed(data)
+        self.server._on_client_name_changed(data)
+        self.server._on_client_latency_changed(data)
+        self.assertEqual([client.identifier for client in self.server.clients], ['test'])
+        self.loop.create_task.assert_called_once()
+        self.loop.create_task.call_args.args[0].close()
+
     def test_on_client_volume_changed(self):
         data = {
             'id': 'test',
@@ -329,6 +788,18 @@ class TestSnapserver(unittest.TestCase):
         self.assertEqual(self.server.client('test').volume, 50)
         self.assertEqual(self.server.client('test').muted, True)
 
+    def test_on_client_unchanged(self):
+        client = self.server.client('test')
+        cb = mock.MagicMock()
+        client.set_callback(cb)
+        self.server._on_client_volume_changed({
+            'id': 'test', 'volume': {'percent': client.volume, 'muted': client.muted}})
+        self.server._on_client_name_changed({'id': 'test', 'name': client.name})
+        self.server._on_client_latency_changed({'id': 'test', 'latency': client.latency})
+        cb.assert_not_called()
+        self.server._on_client_latency_changed({'id': 'test', 'latency': client.latency + 1})
+        cb.assert_called_once_with(client)
+
     def test_on_client_name_changed(self):
         data = {
             'id': 'test',
@@ -361,6 +832,107 @@ class TestSnapserver(unittest.TestCase):
         self.server._on_stream_update(data)
         self.assertEqual(self.server.stream('stream').status, 'idle')
 
+    def test_on_stream_update_group_callback(self):
+        self.server._on_group_stream_changed({'id': 'test', 'stream_id': 'stream'})
+        cb = mock.MagicMock()
+        self.server.group('test').set_callback(cb)
+        data = {
+            'id': 'stream',
+            'stream': {
+                'id': 'stream',
+                'status': 'idle',
+                'uri': {
+                    'query': {
+                        'name': 'stream'
+                    }
+                }
+            }
+        }
+        self.server._on_stream_update(data)
+        cb.assert_called_once_with(self.server.group('test'))
+        self.server._on_group_stream_changed({'id': 'test', 'stream_id': 'other'})
+        cb.reset_mock()
+        self.server._on_stream_update(data)
+        cb.assert_not_called()
+
+    def test_on_stream_meta_group_callback(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['groups'][0]['stream_id'] = 'stream'
+        other = copy.deepcopy(status['server']['groups'][0])
+        other.update({'id': 'other', 'stream_id': 'other', 'clients': []})
+        status['server']['groups'].append(other)
+        self.server.synchronize(status)
+        cb, other_cb = mock.MagicMock(), mock.MagicMock()
+        self.server.group('test').set_callback(cb)
+        self.server.group('other').set_callback(other_cb)
+        self.server._on_stream_meta({'id': 'stream', 'meta': {}})
+        cb.assert_called_once_with(self.server.group('test'))
+        other_cb.assert_not_called()
+
+    def test_group_set_stream_index(self):
+        group = self.server.group('test')
+        self.server._on_group_stream_changed({'id': 'test', 'stream_id': 'stream'})
+
+        async def transact(_server, method, params):
+            # the index moves together with the group's stream
+            self.assertEqual(self.server._groups_of_stream('other'), [group])
+            self.assertEqual(self.server._groups_of_stream('stream'), [])
+            return ({'stream_id': 'other'}, None)
+        with mock.patch.object(Snapserver, '_transact', new=transact):
+            self._run(group.set_stream('other'))
+        self.assertEqual(group.stream, 'other')
+
+    def test_on_stream_update_unknown(self):
+        data = {
+            'id': 'new',
+            'stream': {
+                'id': 'new',
+                'status': 'idle',
+                'uri': {
+                    'query': {
+                        'name': 'new'
+                    }
+                }
+            }
+        }
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['streams'].append(data['stream'])
+
+        async def run():
+            self.server._loop = asyncio.get_running_loop()
+            self.server._on_stream_update(data)
+            self.server._on_stream_update(data)
+            await self.server._resync_task
+        with mock.patch.object(Snapserver, 'status',
+                               new=AsyncMock(return_value=(status, None))) as status_mock:
+            self._run(run())
+            status_mock.assert_awaited_once()
+        self.assertEqual(self.server.stream('new').status, 'idle')
+        self.assertIsNone(self.server._resync_task)
+
+    def test_on_stream_update_unknown_failed(self):
+        data = {'id': 'new', 'stream': {'id': 'new', 'uri': {'query': {'name': 'new'}}}}
+
+        async def run():
+            self.server._loop = asyncio.get_running_loop()
+            self.server._on_stream_update(data)
+            await self.server._resync_task
+            self.assertIsNone(self.server._resync_task)
+            self.server._on_stream_update(data)
+            await self.server._resync_task
+        with mock.patch.object(Snapserver, 'status', new=AsyncMock(
+                return_value=(None, {'code': -1, 'message': 'failed'}))) as status_mock:
+            self._run(run())
+            self.assertEqual(status_mock.await_count, 2)
+        self.assertNotIn('new', self.server._streams)
+
+    def test_on_stream_update_input_only(self):
+        data = {'id': 'new', 'stream': {'id': 'new', 'uri': {'query': {'codec': 'null'}}}}
+        self.server._loop = mock.MagicMock()
+        self.server._on_stream_update(data)
+        self.server._loop.create_task.assert_not_called()
+        self.assertIsNone(self.server._resync_task)
+
     def test_on_meta_update(self):
         data = {
             'id': 'stream',
@@ -383,3 +955,134 @@ class TestSnapserver(unittest.TestCase):
         }
         self.server._on_stream_properties(data)
         self.assertDictEqual(self.server.stream('stream').properties, data['properties'])
+
+    def test_on_properties_update_coalesce(self):
+        cb = mock.MagicMock()
+        self.server.group('test').set_callback(cb)
+        self.server._index_group_stream('test', 'stream')
+        for title in ('a', 'b', 'c'):
+            self.server._callbacks['Stream.OnProperties'](
+                {'id': 'stream', 'properties': {'metadata': {'title': title}}})
+        self.loop.call_soon.assert_called_once_with(self.server._do_stream_properties)
+        cb.assert_not_called()
+        self.server._do_stream_properties()
+        self.assertEqual(self.server.stream('stream').properties['metadata']['title'], 'c')
+        cb.assert_called_once_with(self.server.group('test'))
+        self.assertIsNone(self.server._properties_handle)
+
+    def test_on_properties_update_ordering(self):
+        self.server._callbacks['Stream.OnProperties'](
+            {'id': 'stream', 'properties': {'metadata': {'title': 'old'}}})
+        stream = copy.deepcopy(self.server.stream('stream')._stream)
+        stream['properties'] = {'metadata': {'title': 'new'}}
+        self.server._callbacks['Stream.OnUpdate']({'id': 'stream', 'stream': stream})
+        self.assertIsNone(self.server._properties_handle)
+        self.assertEqual(self.server.stream('stream').properties['metadata']['title'], 'new')
+
+    def test_snapshots(self):
+        groups, clients, streams = self.server.groups, self.server.clients, self.server.streams
+        self.assertIs(self.server.groups, groups)
+        self.assertIs(self.server.clients, clients)
+        self.assertIs(self.server.streams, streams)
+        self.assertEqual(clients, (self.server.client('test'),))
+        self.server._on_client_connect({'id': 'new', 'client': {'id': 'new'}})
+        self.assertEqual(len(self.server.clients), 2)
+        self.server.synchronize(return_values.get('Server.GetStatus'))
+        self.assertIsNot(self.server.groups, groups)
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_notifications_deferred(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['server']['snapserver']['version'] = '0.27.0'
+        protocol = SnapcastProtocol(self.server._callbacks)
+        with mock.patch.object(Snapserver, 'synchronize') as synchronize, \
+                mock.patch.object(Snapserver, '_on_stream_properties') as on_properties:
+            protocol.data_received(
+                json.dumps({'method': 'Server.OnUpdate', 'params': status}).encode() + b'\r\n')
+            synchronize.assert_not_called()
+            protocol.data_received(
+                json.dumps({'method': 'Stream.OnProperties',
+                            'params': {'id': 'stream', 'properties': {}}}).encode() + b'\r\n')
+            # the status is applied on entering properties, the properties stay queued
+            synchronize.assert_called_once_with(status)
+            on_properties.assert_not_called()
+            self.server._do_stream_properties()
+            on_properties.assert_called_once()
+
+    def test_stream_index_group_removed(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        status['server']['groups'][0]['stream_id'] = 'stream'
+        groups = status['server'].pop('groups')
+        status['server']['groups'] = []
+        self.server.synchronize(status)
+        self.assertEqual(self.server._groups_of_stream('stream'), [])
+        status['server']['groups'] = groups
+        self.server.synchronize(status)
+        self.assertEqual(self.server._groups_of_stream('stream'), [self.server.group('test')])
+
+    def test_stream_meta_other_group_skipped(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        other = copy.deepcopy(status['server']['groups'][0])
+        other.update({'id': 'other', 'stream_id': 'other', 'clients': []})
+        status['server']['groups'][0]['stream_id'] = 'stream'
+        status['server']['groups'].append(other)
+        self.server.synchronize(status)
+        test_cb, other_cb = mock.MagicMock(), mock.MagicMock()
+        self.server.group('test').set_callback(test_cb)
+        self.server.group('other').set_callback(other_cb)
+        self.server._on_stream_meta({'id': 'stream', 'meta': {'TITLE': 'new'}})
+        test_cb.assert_called_once_with(self.server.group('test'))
+        other_cb.assert_not_called()
+
+    def test_snapshots_stop(self):
+        self.assertEqual(len(self.server.groups), 1)
+        self.server.stop()
+        self.assertEqual(self.server.groups, ())
+        self.assertEqual(self.server.clients, ())
+        self.assertEqual(self.server.streams, ())
+
+    def test_concurrent_requests_batched(self):
+        transport = MagicMock()
+        protocol = SnapcastProtocol(self.server._callbacks)
+        protocol.connection_made(transport)
+        self.server._protocol = protocol
+        self.server._is_connected = True
+
+        async def run():
+            tasks = asyncio.gather(self.server.client_latency('test', 10),
+                                   self.server.client_name('test', 'name'))
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            transport.write.assert_called_once()
+            requests = json.loads(transport.write.call_args.args[0])
+            protocol.data_received(json.dumps([
+                {'id': requests[0]['id'], 'result': {'latency': 10}},
+                {'id': requests[1]['id'], 'result': {'name': 'name'}}]).encode() + b'\r\n')
+            return await tasks
+        self.assertEqual(self._run(run()), [10, 'name'])
+
+    def test_snapshots_known_client_connect(self):
+        clients = self.server.clients
+        self.server._on_client_connect({'id': 'test', 'client': {'id': 'test'}})
+        self.assertIs(self.server.clients, clients)
+        self.assertIsInstance(clients, tuple)
+
+    def test_group_events_fanout_once(self):
+        status = copy.deepcopy(return_values.get('Server.GetStatus'))
+        group = status['server']['groups'][0]
+        second = copy.deepcopy(group['clients'][0])
+        second['id'] = 'second'
+        group['clients'].append(second)
+        self.server.synchronize(status)
+        client_cbs = {client_id: mock.MagicMock() for client_id in ('test', 'second')}
+        for client_id, cb in client_cbs.items():
+            self.server.client(client_id).set_callback(cb)
+        clients_cb = mock.MagicMock()
+        self.server.set_on_clients_changed_callback(clients_cb)
+        self.server._on_group_mute({'id': 'test', 'mute': True})
+        self.server._on_group_stream_changed({'id': 'test', 'stream_id': 'stream'})
+        self.server._on_stream_properties({'id': 'stream', 'properties': {}})
+        self.server._do_client_callbacks()
+        for cb in client_cbs.values():
+            cb.assert_called_once()
+        clients_cb.assert_called_once_with(['test', 'second'])
@@ -36,6 +36,11 @@ class TestSnapstream(unittest.TestCase):
         self.stream_meta = Snapstream(data_meta)
         self.stream = Snapstream(data)
 
+    def test_slots(self):
+        self.assertFalse(hasattr(self.stream, '__dict__'))
+        for name in Snapstream.__slots__:
+            getattr(self.stream, name)
+
     def test_init(self):
         self.assertEqual(self.stream.identifier, 'test')
         self.assertEqual(self.stream.status, 'playing')